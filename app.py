@@ -3,21 +3,13 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 from pathlib import Path
-import plotly.graph_objects as go
-import requests 
-from streamlit_autorefresh import st_autorefresh 
+from nn_kernel import nearest_index
 
 # FORCING REBUILD - DATE 2025/10/23 (Ensure all dependencies are installed)
 
 # ---------- Page Setup ----------
 st.set_page_config(page_title="Heat Transfer Analysis", layout="wide")
 
-# --- ADDED AUTO-REFRESH COMPONENT ---
-# Forces the entire script to rerun every 20,000 milliseconds (20 seconds) 
-# to fetch new data from ThingSpeak.
-st_autorefresh(interval=20000, key="data_refresh_timer")
-# ------------------------------------
-
 # ---------- CSS (No Change) ----------
 st.markdown("""
 <style>
@@ -47,10 +39,6 @@ footer:after { content:'Developed by Praji'; visibility: visible; display:block;
 </style>
 """, unsafe_allow_html=True)
 
-# ---------- Load Data (No Change) ----------
-DATA_PATH = Path(__file__).parent / "heat_transfer_dataset.csv"
-df = pd.read_csv(DATA_PATH)
-
 # ---------- Limits (CLEANED) ----------
 LIMITS = {
     "ThermalCond": (50, 500),
@@ -58,6 +46,43 @@ LIMITS = {
     "SourceTemp": (30, 150),
     "AmbientTemp": (0, 50),
 }
+FEATURES = ["ThermalCond", "BlockSize", "SourceTemp", "AmbientTemp"]
+
+# Bounds in FEATURES order. float64 for validating raw (possibly live float) inputs;
+# the float32 copies scale features to [0, 1] for the distance kernel. Scaling is an
+# intentional change of metric: without it the distance is dominated by ThermalCond (50-500).
+LIMIT_LO = np.array([LIMITS[k][0] for k in FEATURES], dtype=np.float64)
+LIMIT_HI = np.array([LIMITS[k][1] for k in FEATURES], dtype=np.float64)
+FEAT_LO = LIMIT_LO.astype(np.float32)
+FEAT_SPAN = (LIMIT_HI - LIMIT_LO).astype(np.float32)
+
+# ---------- Load Data (Cached) ----------
+DATA_PATH = Path(__file__).parent / "heat_transfer_dataset.csv"
+TARGETS = ["AvgTemp", "MaxTemp", "CenterTemp"]
+
+def scale_features(a):
+    return ((a - FEAT_LO) / FEAT_SPAN).astype(np.float32)
+
+@st.cache_data
+def load_df(path):
+    """Reads the CSV once per process and precomputes the feature/target matrices.
+
+    The distance kernel runs on contiguous row-major float32 arrays; the
+    DataFrame is kept only for displaying the nearest row.
+    """
+    df = pd.read_csv(path)
+    X = np.ascontiguousarray(df[FEATURES].to_numpy(dtype=np.float32))
+    Xs = np.ascontiguousarray(scale_features(X))
+    y = np.ascontiguousarray(df[TARGETS].to_numpy(dtype=np.float32))
+    return df, Xs, y
+
+@st.cache_resource
+def warm_up_nn(path):
+    """Compiles the nearest-neighbour kernel once per process so the JIT cost isn't paid on a click."""
+    _, Xs, _ = load_df(path)
+    return nearest_index(Xs, Xs[0])
+
+df, Xs, y = load_df(DATA_PATH)
 
 # ---------------------------------------------------
 # !!! FINAL CONFIGURATION (Channel ID Integrated) !!!
@@ -67,8 +92,23 @@ THINGSPEAK_READ_API_KEY = "8XPUACRYN84UOGJ9"
 # ---------------------------------------------------
 
 # ---------- NEW Function to Fetch BOTH Live Data Points ----------
+@st.cache_resource
+def _session(_requests):
+    """Process-wide HTTP session so ThingSpeak requests reuse the keep-alive connection."""
+    s = _requests.Session()
+    s.headers.update({"Accept": "application/json"})
+    return s
+
+# TTL is kept below the 20s live-panel refresh: the clock starts when the result
+# is stored, so ttl=20 would let every other tick hit a stale entry.
+@st.cache_data(ttl=15, show_spinner=False)
 def fetch_live_data():
-    """Fetches the latest entry for ALL fields (Field 1: Ambient, Field 2: Source)."""
+    """Fetches the latest entry for ALL fields (Field 1: Ambient, Field 2: Source).
+
+    Returns (ambient, source, problem) where problem is None or a (level, message)
+    pair. Messages are rendered by the caller so they aren't replayed from the cache.
+    """
+    import requests
     # Use the /feeds/last.json URL to get all fields at once
     url = (
         f"https://api.thingspeak.com/channels/{THINGSPEAK_CHANNEL_ID}/feeds/last.json?"
@@ -76,7 +116,7 @@ def fetch_live_data():
     )
     
     try:
-        response = requests.get(url, timeout=8)
+        response = _session(requests).get(url, timeout=8)
         response.raise_for_status() # Raise exception for bad status codes
         data = response.json()
         
@@ -86,25 +126,27 @@ def fetch_live_data():
 
         if t_ambient and t_source:
             # Return both values as floats
-            return float(t_ambient), float(t_source)
+            return float(t_ambient), float(t_source), None
         else:
-            st.warning("ThingSpeak Warning: Live data not available for Ambient (Field 1) and Source (Field 2). Using default sliders.")
-            return None, None
+            return None, None, ("warning", "ThingSpeak Warning: Live data not available for Ambient (Field 1) and Source (Field 2). Using default sliders.")
             
     except requests.exceptions.RequestException as e:
-        st.error(f"ThingSpeak API Error: Could not fetch live data. Check keys/Channel ID/internet. Error: {e}")
-        return None, None
+        return None, None, ("error", f"ThingSpeak API Error: Could not fetch live data. Check keys/Channel ID/internet. Error: {e}")
     except Exception as e:
-        st.error(f"Data Processing Error: {e}")
-        return None, None
+        return None, None, ("error", f"Data Processing Error: {e}")
 
 
 def check_limits(vals: dict):
+    v = np.array([vals[k] for k in FEATURES], dtype=np.float64)
+    mask = (v < LIMIT_LO) | (v > LIMIT_HI)
+    if not mask.any():
+        return []
+    # Only format messages on the (rare) out-of-range path
     issues = []
-    for k,(lo,hi) in LIMITS.items():
-        v = vals[k]
-        if not (lo <= v <= hi):
-            issues.append(f"{k} should be between {lo} and {hi}")
+    for i in np.flatnonzero(mask):
+        k = FEATURES[i]
+        lo, hi = LIMITS[k]
+        issues.append(f"{k} should be between {lo} and {hi}")
     return issues
 
 def efficiency(max_temp, avg_temp, ambient_temp):
@@ -113,28 +155,72 @@ def efficiency(max_temp, avg_temp, ambient_temp):
         return 0.0
     return (max_temp - avg_temp) / denom
 
+# Sorted thresholds + labels; side='left' keeps the strict ">" boundaries
+# (e.g. exactly 40 °C is still Air Cooling).
+_COOL_THR = np.array([40, 60, 80])
+_COOL_LBL = ("Air Cooling", "Oil Cooling", "Water Cooling", "Liquid Nitrogen")
+_MAT_THR = np.array([80, 150, 300])
+_MAT_LBL = ("Ceramic", "Steel", "Aluminium", "Copper")
+
 def coolant_suggestion(avg_temp):
-    if avg_temp > 80: return "Liquid Nitrogen"
-    elif avg_temp > 60: return "Water Cooling"
-    elif avg_temp > 40: return "Oil Cooling"
-    else: return "Air Cooling"
+    return _COOL_LBL[np.searchsorted(_COOL_THR, avg_temp, side='left')]
 
 def material_suggestion(tc):
-    if tc > 300: return "Copper"
-    elif tc > 150: return "Aluminium"
-    elif tc > 80: return "Steel"
-    else: return "Ceramic"
+    return _MAT_LBL[np.searchsorted(_MAT_THR, tc, side='left')]
 
 def nearest_row_predict(tc, bs, stemp, atemp):
-    # This is the function that caused the error traceback initially if called without proper checks.
     # It finds the closest row in the CSV data to make a prediction.
-    try:
-        d2 = (df["ThermalCond"]-tc)**2 + (df["BlockSize"]-bs)**2 + (df["SourceTemp"]-stemp)**2 + (df["AmbientTemp"]-atemp)**2
-        row = df.loc[d2.idxmin()]
-        return float(row["AvgTemp"]), float(row["MaxTemp"]), float(row["CenterTemp"])
-    except:
-        # Fallback if an unexpected math error occurs during initial load
-        return 0.0, 0.0, 0.0
+    # Inputs are already validated by check_limits; kernel errors (e.g. numba
+    # missing or failing to compile) are left to raise rather than being shown
+    # as fake 0 °C results.
+    q = scale_features(np.array([tc, bs, stemp, atemp], dtype=np.float32))
+    idx = int(nearest_index(Xs, q))
+    avg_t, max_t, ctr_t = y[idx]
+    return float(avg_t), float(max_t), float(ctr_t), idx
+
+@st.fragment(run_every=20)
+def live_panel():
+    """Refreshes only the live ThingSpeak readings every 20 seconds instead of the whole page."""
+    live_ambient, live_source, problem = fetch_live_data()
+    prev = (st.session_state.get("live_ambient"), st.session_state.get("live_source"))
+    first_run = "live_ambient" not in st.session_state
+    st.session_state["live_ambient"] = live_ambient
+    st.session_state["live_source"] = live_source
+
+    if problem is not None:
+        level, msg = problem
+        (st.warning if level == "warning" else st.error)(msg)
+    if live_ambient is not None:
+        st.metric(label="Live Ambient Temp", value=f"{live_ambient:.2f} °C")
+    if live_source is not None:
+        st.metric(label="Live Source Temp", value=f"{live_source:.2f} °C")
+
+    # The rest of the page reads the live values from session_state. Rerun it when
+    # the live/slider switch flips, or when a reading changes while results are shown.
+    if not first_run:
+        availability_changed = (prev[0] is None) != (live_ambient is None) or (prev[1] is None) != (live_source is None)
+        reading_changed = prev != (live_ambient, live_source)
+        if availability_changed or (reading_changed and st.session_state.get("run_button_clicked")):
+            st.rerun(scope="app")
+
+# Constant efficiency-gauge trace as a plain dict; st.plotly_chart accepts a
+# figure dict, so no plotly objects are built or copied in app code.
+_GAUGE_TRACE = {
+    'type': "indicator",
+    'mode': "gauge+number",
+    'title': {'text': "Efficiency (%)"},
+    'gauge': {'axis': {'range': [0, 100]},
+              'bar': {'color': "#22c55e"},
+              'steps': [
+                  {'range': [0, 50], 'color': "#fecaca"},
+                  {'range': [50, 80], 'color': "#fef08a"},
+                  {'range': [80, 100], 'color': "#bbf7d0"}
+              ]},
+}
+
+def gauge_figure(value):
+    """Figure dict for the efficiency gauge showing `value` (in %)."""
+    return {'data': [{**_GAUGE_TRACE, 'value': value}], 'layout': {}}
 
 # ---------- Header (No Change) ----------
 st.markdown("<h1 style='text-align:center;'>🔥 Heat Transfer Analysis</h1>", unsafe_allow_html=True)
@@ -161,8 +247,11 @@ st.sidebar.markdown(f"<span class='input-badge'>Current: {bs} mm</span>", unsafe
 st.sidebar.write("---")
 st.sidebar.subheader("Temperatures")
 
-# --- 1. Fetch Live Data Once ---
-live_ambient, live_source = fetch_live_data()
+# --- 1. Live Data Panel (auto-refreshing fragment) ---
+with st.sidebar:
+    live_panel()
+live_ambient = st.session_state.get("live_ambient")
+live_source = st.session_state.get("live_source")
 
 
 # --- 2. Ambient Temperature (T_cold) Input ---
@@ -170,7 +259,6 @@ atemp_min, atemp_max = LIMITS["AmbientTemp"]
 
 if live_ambient is not None:
     st.sidebar.markdown("**Ambient Temp (°C) - 📡 Field 1 (Live)**", unsafe_allow_html=True)
-    st.sidebar.metric(label="Live Ambient Temp", value=f"{live_ambient:.2f} °C")
     # Cap the live value to stay within the model's limits
     atemp = max(atemp_min, min(atemp_max, live_ambient))
     st.sidebar.caption("Value automatically used for calculation.")
@@ -190,7 +278,6 @@ stemp_min, stemp_max = LIMITS["SourceTemp"]
 
 if live_source is not None:
     st.sidebar.markdown("**Source Temp (°C) - 📡 Field 2 (Live)**", unsafe_allow_html=True)
-    st.sidebar.metric(label="Live Source Temp", value=f"{live_source:.2f} °C")
     # Cap the live value to stay within the model's limits
     stemp = max(stemp_min, min(stemp_max, live_source))
     st.sidebar.caption("Value automatically used for calculation.")
@@ -240,14 +327,23 @@ with box4:
 # ---------- Results (CRITICAL MODIFICATION) ----------
 # The entire results block is now guaranteed to run only with valid data.
 if run and not issues:
-    # 1. RUN PREDICTION
-    # The nearest_row_predict function is now more guarded against initial load errors
-    avg_t, max_t, ctr_t = nearest_row_predict(tc, bs, stemp, atemp)
-    
-    # 2. RUN SECONDARY CALCULATIONS (These caused the traceback)
-    cool = coolant_suggestion(avg_t) 
-    eff = efficiency(max_t, avg_t, atemp)
-    mat = material_suggestion(tc)
+    # Skip recomputation (and gauge rebuild) when the inputs haven't changed since the last run
+    key = (tc, bs, round(stemp, 3), round(atemp, 3))
+    if st.session_state.get("last_key") != key or "last_result" not in st.session_state:
+        # 1. RUN PREDICTION
+        avg_t, max_t, ctr_t, nn_idx = nearest_row_predict(tc, bs, stemp, atemp)
+
+        # 2. RUN SECONDARY CALCULATIONS (These caused the traceback)
+        cool = coolant_suggestion(avg_t)
+        eff = efficiency(max_t, avg_t, atemp)
+        mat = material_suggestion(tc)
+
+        gauge_fig = gauge_figure(eff*100)
+
+        st.session_state.last_result = (avg_t, max_t, ctr_t, nn_idx, eff, cool, mat, gauge_fig)
+        st.session_state.last_key = key
+
+    avg_t, max_t, ctr_t, nn_idx, eff, cool, mat, gauge_fig = st.session_state.last_result
 
     st.write("")
     c1, c2, c3, c4 = st.columns(4)
@@ -269,24 +365,15 @@ if run and not issues:
         st.subheader("Material Suggestion")
         st.info(f"🛠 {mat}")
 
-    gauge_fig = go.Figure(go.Indicator(
-        mode="gauge+number",
-        value=eff*100,
-        title={'text': "Efficiency (%)"},
-        gauge={'axis': {'range': [0, 100]},
-               'bar': {'color': "#22c55e"},
-               'steps': [
-                   {'range': [0, 50], 'color': "#fecaca"},
-                   {'range': [50, 80], 'color': "#fef08a"},
-                   {'range': [80, 100], 'color': "#bbf7d0"}
-               ]}
-    ))
     st.plotly_chart(gauge_fig, use_container_width=True)
 
     with st.expander("See nearest dataset match"):
-        nn = df.loc[((df["ThermalCond"]-tc)**2 + (df["BlockSize"]-bs)**2 + (df["SourceTemp"]-stemp)**2 + (df["AmbientTemp"]-atemp)**2).idxmin()]
-        st.dataframe(nn.to_frame().T)
+        # Reuse the index found by nearest_row_predict instead of recomputing distances
+        st.dataframe(df.iloc[[nn_idx]])
 else:
     # Only show this instruction if there are no errors
     if not issues:
-        st.info("Adjust inputs in the sidebar and click **Calculate**.")
\ No newline at end of file
+        st.info("Adjust inputs in the sidebar and click **Calculate**.")
+
+# ---------- Warm up the kernel after the page has painted ----------
+warm_up_nn(DATA_PATH)
@@ -0,0 +1,29 @@
+# nn_kernel.py - Numba nearest-neighbour scan used by app.py
+#
+# Streamlit re-executes app.py in a fresh __main__ on every rerun, so a kernel
+# decorated there would get a new, uncompiled dispatcher each time. Living in
+# its own module keeps a single compiled dispatcher alive in sys.modules.
+# numba itself is imported lazily so it doesn't slow down the first paint.
+
+_nn = None
+
+
+def _scan(X, q):
+    """Index of the row of X closest to q (squared Euclidean), in a single streaming pass."""
+    best = 1e30
+    bi = 0
+    for i in range(X.shape[0]):
+        d = (X[i, 0]-q[0])**2 + (X[i, 1]-q[1])**2 + (X[i, 2]-q[2])**2 + (X[i, 3]-q[3])**2
+        if d < best:
+            best = d
+            bi = i
+    return bi
+
+
+def nearest_index(X, q):
+    """Compiles the scan on first use, then returns the index of the nearest row."""
+    global _nn
+    if _nn is None:
+        from numba import njit
+        _nn = njit(cache=True, fastmath=True, boundscheck=False)(_scan)
+    return _nn(X, q)